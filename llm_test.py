@@ -15,44 +15,121 @@ This version supports:
 """
 
 import os
+import re
 import json
+import time
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 import argparse
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-import google.generativeai as genai
-from google.generativeai import GenerativeModel
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from rich.prompt import Confirm
-from rich.syntax import Syntax
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
 
 # Default configuration
 DEFAULT_MCP_BRIDGE_URL = "http://localhost:3000"  # Default URL for MCP Bridge
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "your-api-key")
 GEMINI_MODEL = "gemini-2.5-pro-preview-05-06"  # Use the appropriate model as needed
+REQUEST_TIMEOUT = (3, 30)  # (connect, read) timeout in seconds for MCP Bridge calls
+TOOLS_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "mcp-gemini", "tools.json")
+DEFAULT_CACHE_TTL = 300  # Seconds a cached tool discovery result stays valid
+BATCH_TOOL_NAME = "batch_execute"  # Virtual tool handled by the agent instead of MCP Bridge
+RESULT_TOOL_NAME = "get_stored_result"  # Virtual tool for reading results kept out of the chat
+LARGE_RESULT_THRESHOLD = 16_000  # Results longer than this many characters are stored behind a handle
+RESULT_PREVIEW_CHARS = 2_000  # Characters of a stored result sent to Gemini as a preview
+HISTORY_FEEDBACK_LIMIT = 4_096  # Tool feedback in the chat history longer than this is summarized
+HISTORY_SUMMARY_CHARS = 512  # Characters of summarized tool feedback kept in the chat history
+MAX_HISTORY_MESSAGES = 40  # Chat history messages kept before the oldest turns are dropped
+
+# MCP Bridge's 404 for a request routed to a server it does not know
+_UNKNOWN_SERVER_RE = re.compile(r"^Error: Server '[^']*' not found or not connected$")
+
+# Matches a fenced markdown code block, optionally tagged as json
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
 
 console = Console()
+# Syntax highlighting is only worth its tokenizing cost when rendering to a terminal
+_IS_TTY = console.is_terminal
+
+# Shared HTTP session so every MCP Bridge call reuses pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.headers.update({"Connection": "keep-alive"})
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Shared worker pool for concurrent MCP Bridge requests
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="mcp-bridge")
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps_indented(obj):
+    """Serialize an object to JSON indented by two spaces, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+def response_json(response):
+    """Decode a JSON response body directly from its bytes, skipping the text decode."""
+    try:
+        return json_loads(response.content)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON in response: {e}", response=response) from e
 
-def format_json_result(result, show_json=True, max_width=100):
-    """Format JSON result for display, with optional hiding and width control."""
+def _format_dict_fast(result, max_width, formatted=None):
+    """Serialize a dict for display, compacting it when lines are wider than max_width."""
+    # Format with indentation and width control, reusing an existing serialization if given
+    if formatted is None:
+        formatted = json_dumps_indented(result)
+    
+    # If the formatted result is too wide, try to compact it
+    if any(len(line) > max_width for line in formatted.splitlines()):
+        # Compact version with minimal formatting
+        formatted = json.dumps(result, indent=1)
+    return formatted
+
+def _format_dict_safe(result):
+    """Serialize a dict holding values JSON cannot encode, returning None if that fails too."""
+    try:
+        return json.dumps(result, indent=2, default=str)
+    except Exception:
+        return None
+
+def format_json_result(result, *, formatted=None, show_json=True, max_width=100):
+    """Format JSON result for display, with optional hiding and width control.
+    
+    Pass the already-serialized JSON as formatted to skip serializing the result again;
+    it is only re-serialized, more compactly, if a line is wider than max_width.
+    """
     if not show_json:
         return "<JSON result hidden>"
     
     if isinstance(result, dict):
         try:
-            # Format with indentation and width control
-            formatted = json.dumps(result, indent=2)
-            
-            # If the formatted result is too wide, try to compact it
-            if any(len(line) > max_width for line in formatted.split('\n')):
-                # Compact version with minimal formatting
-                formatted = json.dumps(result, indent=1)
-            
-            # Create syntax-highlighted JSON
-            return Syntax(formatted, "json", theme="monokai", word_wrap=True)
-        except Exception:
-            return str(result)
+            formatted = _format_dict_fast(result, max_width, formatted)
+        except TypeError:
+            # Only non-serializable values make the fast path fail
+            formatted = _format_dict_safe(result)
+            if formatted is None:
+                return str(result)
+        
+        # Plain text when the output is piped or logged, highlighted JSON otherwise
+        if not _IS_TTY:
+            from rich.text import Text
+            return Text(formatted)
+        from rich.syntax import Syntax
+        return Syntax(formatted, "json", theme="monokai", word_wrap=True)
     return str(result)
 
 def parse_arguments():
@@ -82,6 +159,9 @@ Examples:
   
   # Adjust JSON width display for better formatting
   python llm_test.py --json-width 120
+  
+  # Always rediscover tools instead of using the on-disk cache
+  python llm_test.py --no-cache
 
 For more information, visit: https://github.com/INQUIRELAB/mcp-bridge-api
 """
@@ -100,6 +180,19 @@ For more information, visit: https://github.com/INQUIRELAB/mcp-bridge-api
         help="Override port in MCP Bridge URL (default: use port from --mcp-url)"
     )
     
+    cache_group = parser.add_argument_group('Cache Options', 'Configure caching of discovered tools')
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Skip the tool discovery cache and always query MCP Bridge"
+    )
+    cache_group.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds before cached tool discovery results expire (default: {DEFAULT_CACHE_TTL})"
+    )
+    
     display_group = parser.add_argument_group('Display Options', 'Configure how information is displayed')
     display_group.add_argument(
         "--hide-json",
@@ -125,93 +218,219 @@ For more information, visit: https://github.com/INQUIRELAB/mcp-bridge-api
 
 def get_mcp_url(args):
     """Construct the MCP Bridge URL from arguments."""
-    mcp_url = args.mcp_url
+    if not args.mcp_port:
+        return args.mcp_url
     
     # If port is specified separately, update the URL
-    if args.mcp_port:
-        import urllib.parse
-        parsed_url = urllib.parse.urlparse(mcp_url)
-        # Reconstruct the URL with the new port
-        mcp_url = urllib.parse.urlunparse((
-            parsed_url.scheme,
-            f"{parsed_url.netloc.split(':')[0]}:{args.mcp_port}",
-            parsed_url.path,
-            parsed_url.params,
-            parsed_url.query,
-            parsed_url.fragment
-        ))
-    
-    return mcp_url
-
-def setup_gemini():
-    """Configure Gemini API with credentials."""
+    parsed_url = urllib.parse.urlparse(args.mcp_url)
+    # Reconstruct the URL with the new port
+    return urllib.parse.urlunparse((
+        parsed_url.scheme,
+        f"{parsed_url.netloc.split(':')[0]}:{args.mcp_port}",
+        parsed_url.path,
+        parsed_url.params,
+        parsed_url.query,
+        parsed_url.fragment
+    ))
+
+@dataclass(frozen=True)
+class BridgeEndpoints:
+    """MCP Bridge endpoint URLs, computed once from the base URL."""
+    base_url: str
+    servers: str
+    health: str
+    confirmations: str
+    tool_urls: dict = field(default_factory=dict, compare=False, repr=False)
+    
+    @classmethod
+    def from_url(cls, base_url):
+        """Build the endpoint set for an MCP Bridge base URL."""
+        return cls(
+            base_url=base_url,
+            servers=f"{base_url}/servers",
+            health=f"{base_url}/health",
+            confirmations=f"{base_url}/confirmations",
+        )
+    
+    def with_tools(self, all_tools):
+        """Return a copy with the execution URL of every discovered tool precomputed."""
+        tool_urls = {
+            (server_id, tool["name"]): f"{self.servers}/{server_id}/tools/{tool['name']}"
+            for server_id, tools in all_tools.items()
+            for tool in tools
+        }
+        return replace(self, tool_urls=tool_urls)
+    
+    def server_tools(self, server_id):
+        """URL listing the tools of a server."""
+        return f"{self.servers}/{server_id}/tools"
+    
+    def tool(self, server_id, tool_name):
+        """URL executing a tool on a server."""
+        url = None
+        # Model output may hold any JSON type; only strings can be looked up in the map
+        if isinstance(server_id, str) and isinstance(tool_name, str):
+            url = self.tool_urls.get((server_id, tool_name))
+        if url is None:
+            url = f"{self.servers}/{server_id}/tools/{tool_name}"
+        return url
+    
+    def confirmation(self, confirmation_id):
+        """URL answering a pending security confirmation."""
+        return f"{self.confirmations}/{confirmation_id}"
+
+def setup_gemini(system_instruction):
+    """Configure Gemini API with credentials and the agent's system instruction."""
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY environment variable is not set")
     
+    # Imported lazily: the Gemini SDK pulls in a large dependency graph
+    import google.generativeai as genai
+    from google.generativeai import GenerativeModel
+    
     genai.configure(api_key=GEMINI_API_KEY)
-    model = GenerativeModel(GEMINI_MODEL)
+    model = GenerativeModel(GEMINI_MODEL, system_instruction=system_instruction)
     console.print("[bold green]✓[/bold green] Gemini API configured successfully")
     return model
 
-def get_all_servers(mcp_bridge_url):
+def get_all_servers(endpoints):
     """Get list of all servers from MCP Bridge."""
     try:
-        response = requests.get(f"{mcp_bridge_url}/servers")
+        response = SESSION.get(endpoints.servers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json().get("servers", [])
+        return response_json(response).get("servers", [])
     except requests.RequestException as e:
         console.print(f"[bold red]Error getting servers:[/bold red] {e}")
         return []
 
-def get_server_tools(server_id, mcp_bridge_url):
+def fetch_server_tools(server_id, endpoints):
+    """Fetch all tools for a specific server, raising RequestException on failure."""
+    response = SESSION.get(endpoints.server_tools(server_id), timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response_json(response).get("tools", [])
+
+def get_server_tools(server_id, endpoints):
     """Get all tools for a specific server."""
     try:
-        response = requests.get(f"{mcp_bridge_url}/servers/{server_id}/tools")
-        response.raise_for_status()
-        return response.json().get("tools", [])
+        return fetch_server_tools(server_id, endpoints)
     except requests.RequestException as e:
         console.print(f"[bold red]Error getting tools for server {server_id}:[/bold red] {e}")
         return []
 
-def get_all_tools(mcp_bridge_url):
-    """Get all tools from all servers."""
-    servers = get_all_servers(mcp_bridge_url)
-    all_tools = {}
+def get_all_tools(endpoints):
+    """Get all tools from all servers, and whether every server's tools were fetched."""
+    servers = get_all_servers(endpoints)
+    if not servers:
+        return {}, False
+    
+    # Fetch each server's tools concurrently; results keep the server order
+    all_tools = {server["id"]: [] for server in servers}
+    complete = True
+    futures = {
+        _EXECUTOR.submit(fetch_server_tools, server["id"], endpoints): server["id"]
+        for server in servers
+    }
+    for future in as_completed(futures):
+        server_id = futures[future]
+        try:
+            all_tools[server_id] = future.result()
+        except requests.RequestException as e:
+            console.print(f"[bold red]Error getting tools for server {server_id}:[/bold red] {e}")
+            complete = False
     
-    for server in servers:
-        server_id = server["id"]
-        tools = get_server_tools(server_id, mcp_bridge_url)
-        all_tools[server_id] = tools
+    return all_tools, complete
+
+def load_cached_tools(path, ttl_seconds, mcp_bridge_url):
+    """Load cached tool discovery results if they are fresh and match the bridge URL."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
     
-    return all_tools
+    if not isinstance(cache, dict) or not isinstance(cache.get("all_tools"), dict):
+        return None
+    if cache.get("mcp_bridge_url") != mcp_bridge_url:
+        return None
+    fetched_at = cache.get("fetched_at")
+    if not isinstance(fetched_at, (int, float)) or isinstance(fetched_at, bool):
+        return None
+    if time.time() - fetched_at >= ttl_seconds:
+        return None
+    return cache
+
+def save_cached_tools(path, mcp_bridge_url, all_tools):
+    """Atomically write tool discovery results to disk."""
+    cache = {
+        "fetched_at": time.time(),
+        "mcp_bridge_url": mcp_bridge_url,
+        "all_tools": all_tools,
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        console.print(f"[bold yellow]Warning:[/bold yellow] Could not write tools cache: {e}")
+
+def build_tool_index(all_tools):
+    """Map each tool name to the (server_id, tool schema) hosting it."""
+    return {
+        tool["name"]: (server_id, tool)
+        for server_id, tools in all_tools.items()
+        for tool in tools
+    }
+
+def fill_server_id(tool_call, all_tools, tool_index):
+    """Fill in a tool call's server_id from the tool index when it is missing or unknown."""
+    if not isinstance(tool_call, dict):
+        return tool_call
+    server_id = tool_call.get("server_id")
+    tool_name = tool_call.get("tool_name")
+    if not isinstance(tool_name, str) or tool_name not in tool_index:
+        return tool_call
+    # Model output may hold any JSON type; only a string server_id can be looked up
+    if not isinstance(server_id, str) or server_id not in all_tools:
+        tool_call["server_id"] = tool_index[tool_name][0]
+    return tool_call
+
+def find_tool_server(tool_name, endpoints):
+    """Find the server hosting a tool, stopping at the first server that has it."""
+    for server in get_all_servers(endpoints):
+        for tool in get_server_tools(server["id"], endpoints):
+            if tool.get("name") == tool_name:
+                return server["id"], tool
+    return None
 
 def create_tools_description(all_tools):
     """Create a description of all available tools for the system instruction."""
-    tools_description = "Available tools by server:\n\n"
+    parts = ["Available tools by server:\n\n"]
     
     for server_id, tools in all_tools.items():
-        tools_description += f"## Server: {server_id}\n\n"
+        parts.append(f"## Server: {server_id}\n\n")
         
         for tool in tools:
-            tools_description += f"### {tool['name']}\n"
-            tools_description += f"Description: {tool.get('description', 'No description')}\n"
+            parts.append(f"### {tool['name']}\n")
+            parts.append(f"Description: {tool.get('description', 'No description')}\n")
             
             # Add input schema information if available
             if "inputSchema" in tool:
-                tools_description += "Parameters:\n"
+                parts.append("Parameters:\n")
                 if "properties" in tool["inputSchema"]:
                     for param, details in tool["inputSchema"]["properties"].items():
                         param_type = details.get("type", "any")
                         param_desc = details.get("description", "")
-                        tools_description += f"- {param} ({param_type}): {param_desc}\n"
+                        parts.append(f"- {param} ({param_type}): {param_desc}\n")
                 
                 # Add required parameters if available
                 if "required" in tool["inputSchema"]:
-                    tools_description += f"Required parameters: {', '.join(tool['inputSchema']['required'])}\n"
+                    parts.append(f"Required parameters: {', '.join(tool['inputSchema']['required'])}\n")
             
-            tools_description += "\n"
+            parts.append("\n")
     
-    return tools_description
+    return "".join(parts)
 
 def create_system_instruction(all_tools):
     """Create a system instruction for Gemini that includes all available tools."""
@@ -238,10 +457,34 @@ Here's information about all the tools you can use:
 
 {tools_description}
 
+## Agent: {BATCH_TOOL_NAME}
+
+You can also run several tool calls in a single step with the virtual tool "{BATCH_TOOL_NAME}".
+Set server_id to "agent", tool_name to "{BATCH_TOOL_NAME}", and parameters to:
+{{
+  "calls": [
+    {{"server_id": "string", "tool_name": "string", "parameters": {{}}}}
+  ],
+  "stop_on_error": true or false
+}}
+With "stop_on_error": true the calls run one after another in the given order and stop at the first failure,
+so use it when later calls depend on earlier ones. With "stop_on_error": false the calls run concurrently,
+so only use it for calls that are independent of each other.
+You will receive one result entry per call, in the same order as the calls.
+
+## Agent: {RESULT_TOOL_NAME}
+
+Large tool results, and results whose server marks them as not to be cached, are not sent to you in full.
+Instead you receive a "result_handle" such as "r0", the result size and, for large results, a preview.
+To read a stored result, set server_id to "agent", tool_name to "{RESULT_TOOL_NAME}", and parameters to:
+{{"handle": "r0", "offset": 0, "length": {LARGE_RESULT_THRESHOLD}}}
+Only read a stored result when you actually need its content.
+
 When a user asks for something that requires using these tools:
 1. Figure out which tool is most appropriate
 2. Format a proper JSON response with the tool_call filled in
-3. Make your response helpful and conversational
+3. If you already know several tool calls you need to make, combine them with {BATCH_TOOL_NAME}
+4. Make your response helpful and conversational
 
 When you receive feedback about a tool execution:
 1. If you need to make another tool call based on the previous result, include it in your tool_call
@@ -262,25 +505,34 @@ If a tool execution returns a result containing "requires_confirmation": true, y
     
     return system_instruction.strip()
 
-def execute_tool(server_id, tool_name, parameters, mcp_bridge_url):
+def _extract_error(e, default_message):
+    """Build an error message for a failed request, preferring the bridge's own error detail."""
+    response = e.response
+    if response is None:
+        return default_message
+    try:
+        error_detail = json_loads(response.content)
+    except ValueError:
+        return default_message
+    if not isinstance(error_detail, dict):
+        return default_message
+    return f"Error: {error_detail.get('error', str(e))}"
+
+def execute_tool(server_id, tool_name, parameters, endpoints):
     """Execute a tool on an MCP server."""
     try:
-        url = f"{mcp_bridge_url}/servers/{server_id}/tools/{tool_name}"
-        response = requests.post(url, json=parameters)
+        url = endpoints.tool(server_id, tool_name)
+        response = SESSION.post(url, json=parameters, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json(), None
+        return response_json(response), None
     except requests.RequestException as e:
-        error_message = f"Error executing tool: {e}"
-        if response := getattr(e, 'response', None):
-            try:
-                error_detail = response.json()
-                error_message = f"Error: {error_detail.get('error', str(e))}"
-            except:
-                pass
-        return None, error_message
+        return None, _extract_error(e, f"Error executing tool: {e}")
 
-def confirm_operation(confirmation_data, mcp_bridge_url):
+def confirm_operation(confirmation_data, endpoints):
     """Process a confirmation request for medium/high risk operations."""
+    from rich.panel import Panel
+    from rich.prompt import Confirm
+    
     console.print(Panel(
         f"[bold yellow]⚠️ Security Confirmation Required[/bold yellow]\n\n"
         f"Operation: [bold]{confirmation_data['method']}[/bold] on server [bold]{confirmation_data['server_id']}[/bold]\n"
@@ -297,28 +549,306 @@ def confirm_operation(confirmation_data, mcp_bridge_url):
     
     if confirmed:
         try:
-            url = f"{mcp_bridge_url}/confirmations/{confirmation_data['confirmation_id']}"
-            response = requests.post(url, json={"confirm": True})
+            url = endpoints.confirmation(confirmation_data['confirmation_id'])
+            response = SESSION.post(url, json={"confirm": True}, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            return response.json(), None
+            return response_json(response), None
         except requests.RequestException as e:
-            error_message = f"Error confirming operation: {e}"
-            if response := getattr(e, 'response', None):
-                try:
-                    error_detail = response.json()
-                    error_message = f"Error: {error_detail.get('error', str(e))}"
-                except:
-                    pass
-            return None, error_message
+            return None, _extract_error(e, f"Error confirming operation: {e}")
     else:
         try:
-            url = f"{mcp_bridge_url}/confirmations/{confirmation_data['confirmation_id']}"
-            response = requests.post(url, json={"confirm": False})
+            url = endpoints.confirmation(confirmation_data['confirmation_id'])
+            response = SESSION.post(url, json={"confirm": False}, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             return {"status": "rejected", "message": "User rejected the operation"}, None
         except requests.RequestException as e:
             return {"status": "rejected", "message": "User rejected the operation"}, None
 
+class ResponseFieldStreamer:
+    """Incrementally extract the top-level "response" string from a streamed JSON reply.
+    
+    Everything else in the reply, including the tool_call, is skipped so it is only shown
+    once the complete reply has been parsed.
+    """
+    
+    _ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+    
+    def __init__(self):
+        self.state = "scan"  # scan -> value (after "response":) -> done
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key = None  # Characters of the depth-1 string being read
+        self.last_key = None  # Last depth-1 string, while it may still be followed by a colon
+        self.unicode = None  # Hex digits of a pending \u escape in the value
+        self.high_surrogate = None
+    
+    def feed(self, text):
+        """Consume the next chunk of the reply and return any newly decoded response text."""
+        out = []
+        for ch in text:
+            if self.state == "done":
+                break
+            if self.state == "value":
+                self._feed_value(ch, out)
+                continue
+            if self.state == "await_value":
+                if ch.isspace():
+                    continue
+                if ch == '"':
+                    self.state = "value"
+                    continue
+                # The response value is not a string; keep scanning from this character
+                self.state = "scan"
+            self._feed_scan(ch)
+        return "".join(out)
+    
+    def _feed_scan(self, ch):
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif ch == "\\":
+                self.escape = True
+            elif ch == '"':
+                self.in_string = False
+                if self.key is not None:
+                    self.last_key = "".join(self.key)
+                    self.key = None
+                return
+            if self.key is not None:
+                self.key.append(ch)
+            return
+        
+        if ch == '"':
+            self.in_string = True
+            self.key = [] if self.depth == 1 else None
+        elif ch == ":":
+            if self.depth == 1 and self.last_key == "response":
+                self.state = "await_value"
+            self.last_key = None
+        elif not ch.isspace():
+            if ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+            self.last_key = None
+    
+    def _feed_value(self, ch, out):
+        if self.unicode is not None:
+            self.unicode += ch
+            if len(self.unicode) == 4:
+                self._emit_codepoint(self.unicode, out)
+                self.unicode = None
+        elif self.escape:
+            self.escape = False
+            if ch == "u":
+                self.unicode = ""
+            else:
+                out.append(self._ESCAPES.get(ch, ch))
+        elif ch == "\\":
+            self.escape = True
+        elif ch == '"':
+            self.state = "done"
+        else:
+            out.append(ch)
+    
+    def _emit_codepoint(self, digits, out):
+        try:
+            code = int(digits, 16)
+        except ValueError:
+            return
+        if 0xD800 <= code <= 0xDBFF:
+            self.high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF:
+            if self.high_surrogate is not None:
+                out.append(chr(0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)))
+            self.high_surrogate = None
+            return
+        self.high_surrogate = None
+        out.append(chr(code))
+
+def send_message_streaming(chat, message):
+    """Send a message to Gemini, previewing the response field as it streams in, and return the full text."""
+    from rich.live import Live
+    from rich.markdown import Markdown
+    
+    response = chat.send_message(message, stream=True)
+    chunks = []
+    streamer = ResponseFieldStreamer()
+    streamed = []
+    # Transient preview: the final reply is rendered once by the caller after parsing
+    with Live(console=console, transient=True, refresh_per_second=8) as live:
+        for chunk in response:
+            try:
+                chunk_text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. a bare finish reason) carry nothing to show
+                continue
+            chunks.append(chunk_text)
+            new_text = streamer.feed(chunk_text)
+            if new_text:
+                streamed.append(new_text)
+                live.update(Markdown("".join(streamed)))
+    return "".join(chunks)
+
+def is_routing_error(error, tool_name):
+    """Whether an execute_tool error means the tool is not on that server, rather than that it failed."""
+    return bool(
+        _UNKNOWN_SERVER_RE.match(error)
+        or f"Unknown tool: {tool_name}" in error
+        or f"Tool {tool_name} not found" in error
+    )
+
+def execute_tool_resolving(server_id, tool_name, parameters, endpoints, tool_index):
+    """Execute a tool, re-resolving its server and retrying once if it was routed to the wrong one."""
+    result, error = execute_tool(server_id, tool_name, parameters, endpoints)
+    if error and is_routing_error(error, tool_name):
+        # Prefer the startup index; only walk the bridge if it has nothing better
+        resolved = tool_index.get(tool_name) if isinstance(tool_name, str) else None
+        if resolved is None or resolved[0] == server_id:
+            resolved = find_tool_server(tool_name, endpoints)
+        if resolved and resolved[0] != server_id:
+            console.print(f"[dim]Tool {tool_name} found on server {resolved[0]}, retrying...[/dim]")
+            result, error = execute_tool(resolved[0], tool_name, parameters, endpoints)
+    return result, error
+
+def execute_tools_parallel(calls, endpoints, tool_index):
+    """Execute independent tool calls concurrently and return (result, error) tuples in input order."""
+    futures = [_EXECUTOR.submit(execute_batch_call, call, endpoints, tool_index) for call in calls]
+    return [future.result() for future in futures]
+
+def confirm_if_required(result, error, endpoints):
+    """Run the security confirmation flow when a tool result asks for it."""
+    if error is None and isinstance(result, dict) and result.get("requires_confirmation") is True:
+        console.print("[bold yellow]Operation requires security confirmation[/bold yellow]")
+        return confirm_operation(result, endpoints)
+    return result, error
+
+def execute_batch_call(call, endpoints, tool_index):
+    """Execute a single call from a batch_execute request."""
+    if not isinstance(call, dict) or not call.get("server_id") or not isinstance(call.get("tool_name"), str):
+        return None, "Invalid call: server_id and tool_name are required"
+    return execute_tool_resolving(call["server_id"], call["tool_name"], call.get("parameters") or {}, endpoints, tool_index)
+
+def make_batch_entry(call, result, error, results_by_id, skipped=False):
+    """Build the result entry reported back to Gemini for one batch call."""
+    call = call if isinstance(call, dict) else {}
+    entry = {"server_id": call.get("server_id"), "tool_name": call.get("tool_name")}
+    if skipped:
+        entry["status"] = "skipped"
+        return entry
+    if error:
+        entry["status"] = "error"
+        entry["error"] = error
+        return entry
+    
+    if isinstance(result, dict) and result.get("status") == "rejected":
+        entry["status"] = "rejected"
+    else:
+        entry["status"] = "success"
+    
+    # Honor the server's cache_hint per call, so batching does not echo a no-cache result
+    if has_no_cache_hint(result):
+        result_str = json_dumps_indented(result)
+        entry["result_handle"] = store_result(results_by_id, result_str)
+        entry["result_omitted"] = f"per server cache_hint ({len(result_str)} characters)"
+    else:
+        entry["result"] = result
+    return entry
+
+def execute_batch(calls, stop_on_error, endpoints, tool_index, results_by_id):
+    """Execute the calls of a batch_execute request and return one entry per call, in call order."""
+    if stop_on_error:
+        # Later calls may depend on earlier ones, so run them in order and stop at the first failure
+        entries = []
+        for call in calls:
+            result, error = execute_batch_call(call, endpoints, tool_index)
+            result, error = confirm_if_required(result, error, endpoints)
+            entries.append(make_batch_entry(call, result, error, results_by_id))
+            if entries[-1]["status"] != "success":
+                break
+        entries.extend(make_batch_entry(call, None, None, results_by_id, skipped=True) for call in calls[len(entries):])
+        return entries
+    
+    # Independent calls run concurrently; confirmations are still asked one at a time
+    entries = []
+    for call, (result, error) in zip(calls, execute_tools_parallel(calls, endpoints, tool_index)):
+        result, error = confirm_if_required(result, error, endpoints)
+        entries.append(make_batch_entry(call, result, error, results_by_id))
+    return entries
+
+def has_no_cache_hint(result):
+    """Whether a tool result asks, via _meta.cache_hint, not to be echoed back to Gemini."""
+    meta = result.get("_meta") if isinstance(result, dict) else None
+    return isinstance(meta, dict) and meta.get("cache_hint") == "no-cache"
+
+def store_result(results_by_id, text):
+    """Keep a result out of the chat and return the handle Gemini can read it back with."""
+    handle = f"r{len(results_by_id)}"
+    results_by_id[handle] = text
+    return handle
+
+def format_tool_feedback(message, result, result_str, results_by_id):
+    """Append a tool result to a feedback message, storing large or no-cache results behind a handle."""
+    no_cache = has_no_cache_hint(result)
+    if not no_cache and len(result_str) <= LARGE_RESULT_THRESHOLD:
+        return f"{message} Result: {result_str}"
+    
+    handle = store_result(results_by_id, result_str)
+    fingerprint = hashlib.sha256(result_str.encode("utf-8")).hexdigest()
+    details = f"result_handle: {handle}, {len(result_str)} characters, sha256: {fingerprint}"
+    if no_cache:
+        return f"{message} Result omitted per server cache_hint ({details})."
+    return f"{message} Result too large to include in full ({details}). Preview: {result_str[:RESULT_PREVIEW_CHARS]}"
+
+def read_stored_result(parameters, results_by_id):
+    """Build the feedback message for a get_stored_result call."""
+    handle = parameters.get("handle") if isinstance(parameters, dict) else None
+    if not isinstance(handle, str) or handle not in results_by_id:
+        return f"The {RESULT_TOOL_NAME} call failed with error: unknown result_handle"
+    
+    stored = results_by_id[handle]
+    try:
+        offset = max(int(parameters.get("offset") or 0), 0)
+        length = min(int(parameters.get("length") or LARGE_RESULT_THRESHOLD), LARGE_RESULT_THRESHOLD)
+    except (TypeError, ValueError):
+        return f"The {RESULT_TOOL_NAME} call failed with error: offset and length must be integers"
+    
+    chunk = stored[offset:offset + length]
+    return f"Stored result {handle}, characters {offset}-{offset + len(chunk)} of {len(stored)}: {chunk}"
+
+def compact_history(chat, results_by_id):
+    """Summarize large tool feedback in the chat history and cap its length."""
+    from google.generativeai import protos
+    
+    feedback_prefixes = ("The tool ", f"The {BATCH_TOOL_NAME} call", "Stored result ")
+    history = list(chat.history)
+    changed = False
+    
+    # Replace large tool feedback with a handle and a short summary; the full text stays readable
+    for i, content in enumerate(history):
+        if content.role != "user" or len(content.parts) != 1:
+            continue
+        text = content.parts[0].text
+        if len(text) <= HISTORY_FEEDBACK_LIMIT or not text.startswith(feedback_prefixes):
+            continue
+        handle = store_result(results_by_id, text)
+        summary = f"Tool feedback of {len(text)} characters stored as result_handle {handle}. Summary: {text[:HISTORY_SUMMARY_CHARS]}…"
+        history[i] = protos.Content(role="user", parts=[protos.Part(text=summary)])
+        changed = True
+    
+    # Drop the oldest turns, starting the kept tail on a user message
+    if len(history) > MAX_HISTORY_MESSAGES:
+        start = len(history) - MAX_HISTORY_MESSAGES
+        while start < len(history) and history[start].role != "user":
+            start += 1
+        history = history[start:]
+        changed = True
+    
+    if changed:
+        chat.history = history
+
 def process_llm_response(text):
     """Process the LLM response to extract the JSON part."""
     # Try to find JSON in the response
@@ -328,7 +858,7 @@ def process_llm_response(text):
             # Remove any line breaks within the JSON
             cleaned_text = ' '.join(json_text.split())
             try:
-                result = json.loads(cleaned_text)
+                result = json_loads(cleaned_text)
                 console.print("[dim]Successfully parsed JSON[/dim]")
                 return result
             except json.JSONDecodeError:
@@ -353,35 +883,17 @@ def process_llm_response(text):
                 console.print(f"[dim]Found valid tool call: {response_data.get('tool_call')}[/dim]")
                 return response_data
 
-        # If no valid JSON found at the end, look for JSON blocks in markdown code blocks
-        if "```json" in text:
-            parts = text.split("```json")
-            if len(parts) > 1:
-                json_block = parts[1].split("```")[0].strip()
-                response_data = clean_and_parse_json(json_block)
-                if response_data and isinstance(response_data, dict):
-                    if "tool_call" not in response_data:
-                        response_data["tool_call"] = None
-                    if "response" not in response_data:
-                        # Use the non-JSON part as the response
-                        non_json_text = text[:text.find("```json")].strip()
-                        response_data["response"] = non_json_text or ""
-                    return response_data
-
-        # If we still haven't found valid JSON, check for any code blocks
-        if "```" in text:
-            parts = text.split("```")
-            for part in parts:
-                if part.strip():
-                    response_data = clean_and_parse_json(part.strip())
-                    if response_data and isinstance(response_data, dict):
-                        if "tool_call" not in response_data:
-                            response_data["tool_call"] = None
-                        if "response" not in response_data:
-                            # Use the non-JSON part as the response
-                            non_json_text = text[:text.find("```")].strip()
-                            response_data["response"] = non_json_text or ""
-                        return response_data
+        # If no valid JSON found at the end, look for JSON in markdown code blocks
+        for match in _FENCE_RE.finditer(text):
+            response_data = clean_and_parse_json(match.group(1))
+            if response_data and isinstance(response_data, dict):
+                if "tool_call" not in response_data:
+                    response_data["tool_call"] = None
+                if "response" not in response_data:
+                    # Use the non-JSON part as the response
+                    non_json_text = text[:match.start()].strip()
+                    response_data["response"] = non_json_text or ""
+                return response_data
 
         # Try to find any JSON-like structure in the text
         if "{" in text and "}" in text:
@@ -417,9 +929,13 @@ def main():
     """Main function to run the MCP-Gemini Agent."""
     # Parse command line arguments
     args = parse_arguments()
+    # Imported after argument parsing so --help and --version exit without loading it
+    from rich.markdown import Markdown
+    
     show_json = not args.hide_json
     json_width = args.json_width
     mcp_bridge_url = get_mcp_url(args)
+    endpoints = BridgeEndpoints.from_url(mcp_bridge_url)
     
     console.print("[bold]MCP-Gemini Agent with Multi-Step Reasoning[/bold]")
     if not show_json:
@@ -428,37 +944,51 @@ def main():
     
     # Check MCP Bridge connection
     try:
-        health_response = requests.get(f"{mcp_bridge_url}/health")
+        health_response = SESSION.get(endpoints.health, timeout=REQUEST_TIMEOUT)
         health_response.raise_for_status()
-        console.print(f"[bold green]✓[/bold green] Connected to MCP Bridge: {health_response.json()['serverCount']} servers found")
+        console.print(f"[bold green]✓[/bold green] Connected to MCP Bridge: {response_json(health_response)['serverCount']} servers found")
     except requests.RequestException as e:
         console.print(f"[bold red]Error connecting to MCP Bridge at {mcp_bridge_url}:[/bold red] {e}")
         console.print("Please make sure MCP Bridge is running. Exiting...")
         return
     
-    # Setup Gemini
-    try:
-        model = setup_gemini()
-    except Exception as e:
-        console.print(f"[bold red]Error setting up Gemini:[/bold red] {e}")
-        return
-    
-    # Get all tools from all servers
-    all_tools = get_all_tools(mcp_bridge_url)
-    if not all_tools:
-        console.print("[bold yellow]Warning:[/bold yellow] No tools found from any server.")
+    # Get all tools from all servers, reusing a fresh on-disk cache when available
+    cache = None if args.no_cache else load_cached_tools(TOOLS_CACHE_PATH, args.cache_ttl, mcp_bridge_url)
+    if cache:
+        all_tools = cache["all_tools"]
+        console.print(f"[bold green]✓[/bold green] Loaded tools for {len(all_tools)} servers from cache")
     else:
-        console.print(f"[bold green]✓[/bold green] Found tools from {len(all_tools)} servers")
+        all_tools, complete = get_all_tools(endpoints)
+        if not all_tools:
+            console.print("[bold yellow]Warning:[/bold yellow] No tools found from any server.")
+        else:
+            console.print(f"[bold green]✓[/bold green] Found tools from {len(all_tools)} servers")
+        # Only cache a complete discovery, so a transient failure is retried on the next start
+        if complete and all_tools and not args.no_cache:
+            save_cached_tools(TOOLS_CACHE_PATH, mcp_bridge_url, all_tools)
     
     # Create system instruction with tools information
     system_instruction = create_system_instruction(all_tools)
     
+    # Index tools by name and precompute their execution URLs for O(1) dispatch
+    tool_index = build_tool_index(all_tools)
+    endpoints = endpoints.with_tools(all_tools)
+    
+    # Setup Gemini with the system instruction as a native model parameter
+    try:
+        model = setup_gemini(system_instruction)
+    except Exception as e:
+        console.print(f"[bold red]Error setting up Gemini:[/bold red] {e}")
+        return
+    
     # Create chat session
     console.print("\n[bold]Starting chat session. Type 'exit' to quit.[/bold]\n")
     
     # Initialize chat
     chat = model.start_chat(history=[])
-    chat.send_message(system_instruction)  # Send system instruction as first message
+    
+    # Tool results kept out of the chat history, keyed by the handle given to Gemini
+    results_by_id = {}
     
     # Main chat loop
     while True:
@@ -467,75 +997,97 @@ def main():
         if user_input.lower() in ["exit", "quit"]:
             break
         
-        # Send message to Gemini
-        response = chat.send_message(user_input)
+        # Send message to Gemini, streaming the reply as it arrives
+        response_text = send_message_streaming(chat, user_input)
+        compact_history(chat, results_by_id)
         
         # Process the response
-        processed_response = process_llm_response(response.text)
+        processed_response = process_llm_response(response_text)
         
         # Display the text response part
         console.print("\nAI:", style="bold")
         console.print(Markdown(processed_response["response"]))
         
         # Extract tool call information
-        tool_call = processed_response.get("tool_call") or {}
+        tool_call = fill_server_id(processed_response.get("tool_call") or {}, all_tools, tool_index)
         
         # Continue as long as there's a tool call to make
-        while tool_call and all(tool_call.get(k) is not None for k in ["server_id", "tool_name", "parameters"]):
+        while tool_call:
             server_id = tool_call.get("server_id")
             tool_name = tool_call.get("tool_name")
             parameters = tool_call.get("parameters")
+            if None in (server_id, tool_name, parameters):
+                break
             
-            # Show the tool call parameters
-            if show_json:
-                console.print(f"\n[bold yellow]Executing tool:[/bold yellow] {server_id}/{tool_name}")
-                console.print("Parameters:", style="bold")
-                console.print(format_json_result(parameters, show_json=True, max_width=json_width))
-            else:
-                console.print(f"\n[bold yellow]Executing tool:[/bold yellow] {server_id}/{tool_name} (parameters hidden)")
-            
-            # Execute the tool
-            result, error = execute_tool(server_id, tool_name, parameters, mcp_bridge_url)
-            
-            # Check if the operation requires confirmation
-            if error is None and isinstance(result, dict) and result.get("requires_confirmation") is True:
-                console.print("[bold yellow]Operation requires security confirmation[/bold yellow]")
-                # Handle the confirmation
-                result, error = confirm_operation(result, mcp_bridge_url)
-            
-            # Handle errors
-            if error:
-                console.print(f"[bold red]Tool execution failed:[/bold red] {error}")
-                tool_feedback = f"The tool execution failed with error: {error}"
+            if tool_name == BATCH_TOOL_NAME:
+                # Run the whole batch locally and report all results in a single message
+                calls = parameters.get("calls") if isinstance(parameters, dict) else None
+                if not isinstance(calls, list) or not calls:
+                    console.print(f"[bold red]Invalid {BATCH_TOOL_NAME} call:[/bold red] missing calls list")
+                    tool_feedback = f"The {BATCH_TOOL_NAME} call failed with error: parameters.calls must be a non-empty list"
+                else:
+                    calls = [fill_server_id(call, all_tools, tool_index) for call in calls]
+                    console.print(f"\n[bold yellow]Executing batch:[/bold yellow] {len(calls)} tool calls")
+                    batch_results = {"results": execute_batch(calls, bool(parameters.get("stop_on_error")), endpoints, tool_index, results_by_id)}
+                    
+                    batch_str = json_dumps_indented(batch_results)
+                    
+                    console.print("Results:", style="bold")
+                    console.print(format_json_result(batch_results, formatted=batch_str, show_json=show_json, max_width=json_width))
+                    tool_feedback = format_tool_feedback(
+                        f"The {BATCH_TOOL_NAME} call with {len(calls)} tool calls finished; results are in call order.",
+                        batch_results, batch_str, results_by_id
+                    )
+            elif tool_name == RESULT_TOOL_NAME:
+                handle = parameters.get("handle") if isinstance(parameters, dict) else None
+                console.print(f"\n[bold yellow]Reading stored result:[/bold yellow] {handle}")
+                tool_feedback = read_stored_result(parameters, results_by_id)
             else:
-                console.print(f"[bold green]Tool execution successful[/bold green]")
-                
-                # Format and display the result
-                if isinstance(result, dict):
-                    result_str = json.dumps(result, indent=2)
+                # Show the tool call parameters
+                if show_json:
+                    console.print(f"\n[bold yellow]Executing tool:[/bold yellow] {server_id}/{tool_name}")
+                    console.print("Parameters:", style="bold")
+                    console.print(format_json_result(parameters, show_json=True, max_width=json_width))
                 else:
-                    result_str = str(result)
+                    console.print(f"\n[bold yellow]Executing tool:[/bold yellow] {server_id}/{tool_name} (parameters hidden)")
                 
-                # Display the result based on show_json setting
-                console.print("Result:", style="bold")
-                console.print(format_json_result(result, show_json, json_width))
+                # Execute the tool and handle any security confirmation
+                result, error = execute_tool_resolving(server_id, tool_name, parameters, endpoints, tool_index)
+                result, error = confirm_if_required(result, error, endpoints)
                 
-                # Check if the operation was rejected by the user
-                if isinstance(result, dict) and result.get("status") == "rejected":
-                    tool_feedback = f"The operation was cancelled by the user: {result.get('message', 'No reason provided')}"
+                # Handle errors
+                if error:
+                    console.print(f"[bold red]Tool execution failed:[/bold red] {error}")
+                    tool_feedback = f"The tool execution failed with error: {error}"
                 else:
-                    tool_feedback = f"The tool {tool_name} was executed successfully. Result: {result_str}"
+                    console.print(f"[bold green]Tool execution successful[/bold green]")
+                    
+                    # Serialize the result once for both display and feedback
+                    result_str = json_dumps_indented(result) if isinstance(result, dict) else str(result)
+                    
+                    # Display the result based on show_json setting
+                    console.print("Result:", style="bold")
+                    console.print(format_json_result(result, formatted=result_str, show_json=show_json, max_width=json_width))
+                    
+                    # Check if the operation was rejected by the user
+                    if isinstance(result, dict) and result.get("status") == "rejected":
+                        tool_feedback = f"The operation was cancelled by the user: {result.get('message', 'No reason provided')}"
+                    else:
+                        tool_feedback = format_tool_feedback(
+                            f"The tool {tool_name} was executed successfully.", result, result_str, results_by_id
+                        )
             
             # Send feedback to Gemini
-            response = chat.send_message(tool_feedback)
-            processed_response = process_llm_response(response.text)
+            response_text = send_message_streaming(chat, tool_feedback)
+            compact_history(chat, results_by_id)
+            processed_response = process_llm_response(response_text)
             
             # Display the feedback response
             console.print("\nAI:", style="bold")
             console.print(Markdown(processed_response["response"]))
             
             # Get the next tool call if any
-            tool_call = processed_response.get("tool_call") or {}
+            tool_call = fill_server_id(processed_response.get("tool_call") or {}, all_tools, tool_index)
         
         console.print("\n" + "-" * 50 + "\n")
 